@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.utils.profiler import armazenamento_perfis, token_valido
+
+async def verificar_token_admin(authorization: Optional[str] = Header(None)):
+    """
+    Exige `Authorization: Bearer <PROFILING_TOKEN>`.
+    
+    Raises:
+        HTTPException: Se o token estiver ausente, incorreto ou não configurado
+    """
+    esperado = f"Bearer {settings.profiling_token}" if settings.profiling_token else None
+    if not token_valido(authorization, esperado):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de administração inválido",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+router = APIRouter(
+    prefix="/api/v1/admin",
+    tags=["métricas"],
+    dependencies=[Depends(verificar_token_admin)],
+    responses={
+        401: {"description": "Token de administração inválido"},
+        404: {"description": "Perfil não encontrado"}
+    }
+)
+
+@router.get(
+    "/perfis",
+    summary="Lista os perfis de requisições coletados",
+    description="""
+    Lista os últimos perfis coletados pelo middleware de profiling, do mais recente ao mais antigo.
+    
+    Um perfil é gerado quando a requisição traz o cabeçalho de debug configurado
+    (`PROFILING_HEADER`) com o valor de `PROFILING_TOKEN`, ou é sorteada pela taxa
+    `PROFILING_SAMPLE_RATE`. Requer `Authorization: Bearer <PROFILING_TOKEN>`.
+    """
+)
+async def listar_perfis() -> List[Dict[str, Any]]:
+    """
+    Lista os perfis disponíveis.
+    
+    Returns:
+        List[Dict[str, Any]]: Metadados de cada perfil (tempo de parede, no loop e de CPU)
+    """
+    return armazenamento_perfis.listar()
+
+@router.get(
+    "/perfis/{perfil_id}",
+    summary="Baixa um perfil de requisição",
+    description="""
+    Retorna o perfil no formato de pilhas colapsadas (`collapsed`, para flamegraph.pl)
+    ou no formato do speedscope (`speedscope`, com perfis de parede e de CPU).
+    
+    Requer `Authorization: Bearer <PROFILING_TOKEN>`.
+    """
+)
+async def obter_perfil(perfil_id: str, formato: str = "speedscope"):
+    """
+    Baixa um perfil específico.
+    
+    Args:
+        perfil_id (str): Id retornado no cabeçalho X-Profile-Id
+        formato (str): collapsed ou speedscope
+        
+    Returns:
+        FileResponse: Arquivo do perfil
+        
+    Raises:
+        HTTPException: Se o perfil ou o formato não existir
+    """
+    caminho = armazenamento_perfis.caminho(perfil_id, formato)
+    if caminho is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfil não encontrado"
+        )
+    media_type = "text/plain" if formato == "collapsed" else "application/json"
+    return FileResponse(caminho, media_type=media_type, filename=caminho.rsplit("/", 1)[-1])
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
 from app.models.schemas import AnaliseInput, AnaliseOutput, ResultadoHistorico
-from app.services.iag_service import processar_analise
+from app.services.iag_service import processar_analise, iag_service
+from app.services.export_service import FORMATOS_EXPORTACAO, gerar_exportacao
 from app.validation.input_validator import InputValidator
 from app.validation.output_validator import OutputValidator
-from app.db.connection import get_db
+from app.db.connection import get_db, AsyncSessionLocal
 from app.db.repository import ResultadoRepository
+from app.core.config import settings
+from app.utils.trace import registrar_requisicao
 
 router = APIRouter(
     prefix="/api/v1",
@@ -79,6 +84,13 @@ async def analisar_texto(
     Raises:
         HTTPException: Em caso de erro na validação ou processamento
     """
+    if settings.trace_file:
+        await registrar_requisicao(
+            settings.trace_file,
+            len(dados.texto),
+            dados.opcoes.model_dump() if dados.opcoes else None
+        )
+
     try:
         # Valida entrada
         InputValidator.validar(dados.texto)
@@ -143,3 +155,103 @@ async def listar_historico(
         List[ResultadoHistorico]: Lista de resumos gerados
     """
     return await ResultadoRepository.listar(db, limit, offset)
+
+@router.get(
+    "/metricas",
+    tags=["métricas"],
+    summary="Métricas de uso do modelo",
+    description="""
+    Endpoint para consulta das métricas de aproveitamento das chamadas ao modelo.
+    
+    ## Resposta
+    - `chamadas_modelo`: Chamadas feitas ao modelo, incluindo retentativas
+    - `resumos_validos`: Resumos aprovados pela validação de saída
+    - `retentativas`: Novas chamadas feitas após uma validação rejeitada
+    - `falhas_validacao`: Respostas rejeitadas pela validação
+    - `acertos_cache`: Requisições atendidas pelo cache, sem chamada ao modelo
+    - `resumos_validos_por_chamada`: Vazão efetiva (resumos válidos / chamadas)
+    
+    Os contadores são do processo atual (um por worker).
+    """
+)
+async def obter_metricas():
+    """
+    Retorna as métricas de chamadas ao modelo deste processo.
+    
+    Returns:
+        dict: Contadores e vazão efetiva de resumos válidos por chamada
+    """
+    return iag_service.metricas.resumo()
+
+@router.get(
+    "/historico/export",
+    summary="Exporta o histórico de resumos em streaming",
+    description="""
+    Endpoint para exportação em massa do histórico de resumos.
+    
+    ## Funcionalidades
+    - Leitura via cursor no servidor, com memória constante
+    - Filtragem por intervalo de datas e de ids
+    - Formatos NDJSON, CSV e Parquet
+    
+    ## Parâmetros
+    - `formato`: Formato de saída (ndjson, csv ou parquet; padrão: ndjson)
+    - `data_inicio` / `data_fim`: Intervalo de criação [início, fim)
+    - `id_inicio` / `id_fim`: Intervalo de ids [início, fim]
+    
+    ## Resposta
+    Arquivo transmitido em partes, ordenado por id.
+    
+    ## Erros
+    - 400: Formato inválido ou dependência ausente
+    """,
+    responses={
+        200: {"description": "Histórico exportado com sucesso"},
+        400: {"description": "Formato de exportação inválido"}
+    }
+)
+async def exportar_historico(
+    formato: str = Query("ndjson", description="Formato de saída: ndjson, csv ou parquet"),
+    data_inicio: Optional[datetime] = None,
+    data_fim: Optional[datetime] = None,
+    id_inicio: Optional[int] = None,
+    id_fim: Optional[int] = None
+):
+    """
+    Exporta o histórico de resumos sem materializar o resultado em memória.
+    
+    Args:
+        formato (str): Formato de saída (ndjson, csv ou parquet)
+        data_inicio (Optional[datetime]): Data mínima de criação (inclusiva)
+        data_fim (Optional[datetime]): Data máxima de criação (exclusiva)
+        id_inicio (Optional[int]): Id mínimo (inclusivo)
+        id_fim (Optional[int]): Id máximo (inclusivo)
+        
+    Returns:
+        StreamingResponse: Conteúdo exportado no formato solicitado
+        
+    Raises:
+        HTTPException: Em caso de formato inválido
+    """
+    # A sessão é aberta pelo próprio gerador, para viver enquanto o stream durar
+    linhas = ResultadoRepository.exportar(
+        AsyncSessionLocal,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        id_inicio=id_inicio,
+        id_fim=id_fim
+    )
+
+    try:
+        conteudo = gerar_exportacao(formato, linhas)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return StreamingResponse(
+        conteudo,
+        media_type=FORMATOS_EXPORTACAO[formato],
+        headers={"Content-Disposition": f'attachment; filename="historico.{formato}"'}
+    )
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Optional
 
 class Settings(BaseSettings):
     # Configurações da API
@@ -12,12 +13,39 @@ class Settings(BaseSettings):
     google_api_key: str = Field(..., env="GOOGLE_API_KEY")
     model_provider: str = Field("gemini", env="MODEL_PROVIDER")  # Ex: "openai", "gemini"
 
+    # Saída do modelo: JSON estruturado (resumo, classificação, palavras-chave) e
+    # número de novas tentativas quando o resumo é rejeitado pela validação
+    structured_output: bool = Field(False, env="STRUCTURED_OUTPUT")
+    output_retry_budget: int = Field(1, env="OUTPUT_RETRY_BUDGET")
+
     # db
     database_url: str = Field(
         "postgresql+asyncpg://user:senha123@db:5432/db_analise", 
         env="DATABASE_URL"
     )
 
+    # Gravação de tráfego de /analise em JSONL (desativada se vazio)
+    trace_file: Optional[str] = Field(None, env="TRACE_FILE")
+
+    # Cache de resumos compartilhado entre workers (SQLite WAL; desativado se vazio)
+    cache_file: Optional[str] = Field(None, env="CACHE_FILE")
+    cache_max_bytes: int = Field(256 * 1024 * 1024, env="CACHE_MAX_BYTES")
+
+    # Resumo incremental por parágrafo (requer CACHE_FILE para guardar os resumos parciais)
+    incremental_summary: bool = Field(False, env="INCREMENTAL_SUMMARY")
+    # Máximo de parágrafos resumidos em paralelo por requisição no modo incremental
+    incremental_max_concurrency: int = Field(4, env="INCREMENTAL_MAX_CONCURRENCY")
+
+    # Profiling de requisições (middleware só é registrado se habilitado)
+    profiling_enabled: bool = Field(False, env="PROFILING_ENABLED")
+    profiling_sample_rate: float = Field(0.0, env="PROFILING_SAMPLE_RATE")
+    profiling_header: str = Field("X-Debug-Profile", env="PROFILING_HEADER")
+    # Segredo exigido no cabeçalho de debug e nos endpoints /admin (sem ele, ambos ficam fechados)
+    profiling_token: Optional[str] = Field(None, env="PROFILING_TOKEN")
+    profiling_interval_ms: float = Field(2.0, env="PROFILING_INTERVAL_MS")
+    profiling_max_profiles: int = Field(20, env="PROFILING_MAX_PROFILES")
+    profiling_dir: str = Field("profiles", env="PROFILING_DIR")
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL,
+    tamanho INTEGER NOT NULL,
+    acessado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_acessado_em ON cache (acessado_em);
+CREATE TABLE IF NOT EXISTS cache_total (id INTEGER PRIMARY KEY CHECK (id = 1), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO cache_total (id, bytes) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_total SET bytes = bytes + NEW.tamanho WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_total SET bytes = bytes - OLD.tamanho WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF tamanho ON cache BEGIN
+    UPDATE cache_total SET bytes = bytes - OLD.tamanho + NEW.tamanho WHERE id = 1;
+END;
+"""
+
+
+class CacheResumos:
+    """
+    Cache chave-valor em um arquivo SQLite (modo WAL), compartilhado entre os
+    processos workers de um mesmo host.
+
+    Leituras não bloqueiam escritas nem outras leituras. A remoção é LRU
+    aproximada: o instante de acesso só é regravado quando está mais velho que
+    `resolucao_acesso` segundos, o que evita transformar cada leitura em escrita.
+    Essa regravação usa uma conexão que não espera por locks: se outro worker
+    estiver escrevendo, ela é simplesmente pulada e a leitura não fica presa.
+    Ao passar de `max_bytes`, as entradas menos usadas são removidas até o
+    total cair para 90% do limite.
+    """
+
+    def __init__(self, caminho: str, max_bytes: int, resolucao_acesso: float = 60.0):
+        self.caminho = caminho
+        self.max_bytes = max_bytes
+        self.resolucao_acesso = resolucao_acesso
+        self._local = threading.local()
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        conn = self._conexao()
+        conn.executescript(_SCHEMA)
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (o asyncio.to_thread usa threads do pool)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _conexao_leitura(self) -> sqlite3.Connection:
+        """Conexão por thread para o caminho de leitura, com busy_timeout 0."""
+        conn = getattr(self._local, "conn_leitura", None)
+        if conn is None:
+            # O modo WAL fica gravado no arquivo pelo __init__; aqui só se lê
+            conn = sqlite3.connect(self.caminho, timeout=0, isolation_level=None)
+            self._local.conn_leitura = conn
+        return conn
+
+    @staticmethod
+    def chave(*partes: str) -> str:
+        """Gera a chave do cache a partir das partes que determinam o resultado."""
+        h = hashlib.sha256()
+        for parte in partes:
+            h.update(parte.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def obter(self, chave: str) -> Optional[str]:
+        conn = self._conexao_leitura()
+        linha = conn.execute(
+            "SELECT valor, acessado_em FROM cache WHERE chave = ?", (chave,)
+        ).fetchone()
+        if linha is None:
+            return None
+
+        valor, acessado_em = linha
+        agora = time.time()
+        if agora - acessado_em > self.resolucao_acesso:
+            try:
+                conn.execute("UPDATE cache SET acessado_em = ? WHERE chave = ?", (agora, chave))
+            except sqlite3.OperationalError:
+                # Outro worker tem o lock de escrita: a atualização do LRU fica para a próxima leitura
+                pass
+        return valor
+
+    def gravar(self, chave: str, valor: str) -> None:
+        conn = self._conexao()
+        tamanho = len(chave) + len(valor.encode("utf-8"))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cache (chave, valor, tamanho, acessado_em) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor, "
+                "tamanho = excluded.tamanho, acessado_em = excluded.acessado_em",
+                (chave, valor, tamanho, time.time())
+            )
+            total = conn.execute("SELECT bytes FROM cache_total WHERE id = 1").fetchone()[0]
+            if total > self.max_bytes:
+                self._remover_antigos(conn, total - int(self.max_bytes * 0.9))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _remover_antigos(self, conn: sqlite3.Connection, bytes_a_liberar: int) -> None:
+        liberados = 0
+        removidas = []
+        for chave, tamanho in conn.execute("SELECT chave, tamanho FROM cache ORDER BY acessado_em"):
+            if liberados >= bytes_a_liberar:
+                break
+            removidas.append((chave,))
+            liberados += tamanho
+        conn.executemany("DELETE FROM cache WHERE chave = ?", removidas)
+
+    def tamanho_total(self) -> int:
+        return self._conexao().execute("SELECT bytes FROM cache_total WHERE id = 1").fetchone()[0]
@@ -1,8 +1,10 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
 from sqlalchemy import select
 from app.models.sql_models import ResultadoAnalise
 from app.models.schemas import ResultadoHistorico
-from typing import List
+from typing import List, Optional, AsyncIterator, Dict, Any
+from datetime import datetime
 
 class ResultadoRepository:
 
@@ -40,3 +42,56 @@ class ResultadoRepository:
             )
             for reg in registros
         ]
+
+    @staticmethod
+    async def exportar(
+        sessao_factory: sessionmaker,
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None,
+        id_inicio: Optional[int] = None,
+        id_fim: Optional[int] = None,
+        tamanho_lote: int = 1000
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Percorre o histórico com um cursor no servidor, sem carregar o resultado inteiro.
+
+        As linhas são lidas em lotes de `tamanho_lote` e entregues como dicionários
+        planos, na ordem do id, para que o consumo de memória seja constante.
+
+        A sessão é aberta aqui dentro, e não recebida via get_db, para durar
+        exatamente o tempo do stream: a dependência de uma rota é encerrada antes
+        de o corpo de um StreamingResponse ser enviado.
+        """
+        colunas = (
+            ResultadoAnalise.id,
+            ResultadoAnalise.texto,
+            ResultadoAnalise.resumo,
+            ResultadoAnalise.classificacao,
+            ResultadoAnalise.criado_em,
+        )
+        query = select(*colunas).order_by(ResultadoAnalise.id)
+
+        if data_inicio is not None:
+            query = query.where(ResultadoAnalise.criado_em >= data_inicio)
+        if data_fim is not None:
+            query = query.where(ResultadoAnalise.criado_em < data_fim)
+        if id_inicio is not None:
+            query = query.where(ResultadoAnalise.id >= id_inicio)
+        if id_fim is not None:
+            query = query.where(ResultadoAnalise.id <= id_fim)
+
+        async with sessao_factory() as db:
+            result = await db.stream(query.execution_options(yield_per=tamanho_lote))
+            async for reg in result:
+                tamanho_original = len(reg.texto)
+                tamanho_resumo = len(reg.resumo)
+                yield {
+                    "id": reg.id,
+                    "texto_original": reg.texto,
+                    "resumo": reg.resumo,
+                    "classificacao": reg.classificacao,
+                    "tamanho_original": tamanho_original,
+                    "tamanho_resumo": tamanho_resumo,
+                    "taxa_compressao": tamanho_resumo / tamanho_original if tamanho_original else 0.0,
+                    "criado_em": reg.criado_em,
+                }
@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 from app.api.routes import router as api_router
+from app.api.admin import router as admin_router
 from app.utils.logger import setup_logger
 from app.core.config import settings
 from app.db.init_db import init_db
+from app.utils.profiler import ProfilingMiddleware, armazenamento_perfis
 import asyncio
 
 # Configura o logger
@@ -105,5 +107,18 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️ Erro ao inicializar banco de dados: {e}")
 
+# Profiling por requisição: sem o middleware, não há custo algum quando desabilitado
+if settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        armazenamento=armazenamento_perfis,
+        taxa_amostragem=settings.profiling_sample_rate,
+        cabecalho=settings.profiling_header,
+        intervalo=settings.profiling_interval_ms / 1000,
+        token=settings.profiling_token
+    )
+
 # Inclui rotas
 app.include_router(api_router)
+if settings.profiling_enabled:
+    app.include_router(admin_router)
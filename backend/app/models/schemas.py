@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class OpcoesResumo(BaseModel):
@@ -72,6 +72,7 @@ class AnaliseOutput(BaseModel):
     """Modelo de saída da análise."""
     resumo: str = Field(..., description="Resumo gerado a partir do texto.")
     classificacao: str = Field(..., description="Classificação do conteúdo (ex: biologia, matemática, etc).")
+    palavras_chave: List[str] = Field(default_factory=list, description="Palavras-chave do texto (modo de saída estruturada)")
     metadata: Optional[Metadata] = Field(None, description="Metadados do processamento")
 
     model_config = {
@@ -79,6 +80,7 @@ class AnaliseOutput(BaseModel):
             "example": {
                 "resumo": "Processo de fotossíntese: conversão de energia luminosa em química pelas plantas, gerando oxigênio. Fundamental para a vida na Terra.",
                 "classificacao": "biologia",
+                "palavras_chave": ["fotossíntese", "plantas", "oxigênio"],
                 "metadata": {
                     "tempo_processamento": 2.5,
                     "tamanho_original": 250,
@@ -0,0 +1,127 @@
+import csv
+import importlib.util
+import io
+import json
+from typing import AsyncIterator, Dict, Any, List
+
+# Colunas exportadas, na ordem em que aparecem em CSV e Parquet
+COLUNAS_EXPORTACAO = [
+    "id",
+    "texto_original",
+    "resumo",
+    "classificacao",
+    "tamanho_original",
+    "tamanho_resumo",
+    "taxa_compressao",
+    "criado_em",
+]
+
+FORMATOS_EXPORTACAO = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class _BufferSaida(io.RawIOBase):
+    """Arquivo em memória que é esvaziado a cada leitura, usado como destino do ParquetWriter."""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._posicao = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, dados) -> int:
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def drenar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+async def gerar_ndjson(linhas: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Serializa cada linha como um objeto JSON por linha."""
+    async for linha in linhas:
+        yield (json.dumps(linha, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+async def gerar_csv(linhas: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Serializa as linhas em CSV, emitindo o cabeçalho primeiro."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUNAS_EXPORTACAO)
+
+    writer.writeheader()
+    yield buffer.getvalue().encode("utf-8")
+
+    async for linha in linhas:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(linha)
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def gerar_parquet(
+    linhas: AsyncIterator[Dict[str, Any]],
+    tamanho_grupo: int = 1000
+) -> AsyncIterator[bytes]:
+    """
+    Serializa as linhas em Parquet, um row group a cada `tamanho_grupo` linhas.
+
+    Cada row group é enviado assim que escrito, de modo que apenas um lote
+    fica em memória por vez.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("texto_original", pa.string()),
+        ("resumo", pa.string()),
+        ("classificacao", pa.string()),
+        ("tamanho_original", pa.int64()),
+        ("tamanho_resumo", pa.int64()),
+        ("taxa_compressao", pa.float64()),
+        ("criado_em", pa.timestamp("us", tz="UTC")),
+    ])
+
+    destino = _BufferSaida()
+    writer = pq.ParquetWriter(destino, schema)
+    lote: List[Dict[str, Any]] = []
+
+    try:
+        async for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= tamanho_grupo:
+                writer.write_table(pa.Table.from_pylist(lote, schema=schema))
+                lote.clear()
+                yield destino.drenar()
+
+        if lote:
+            writer.write_table(pa.Table.from_pylist(lote, schema=schema))
+    finally:
+        writer.close()
+
+    yield destino.drenar()
+
+
+def gerar_exportacao(formato: str, linhas: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Retorna o gerador de bytes correspondente ao formato solicitado."""
+    geradores = {
+        "ndjson": gerar_ndjson,
+        "csv": gerar_csv,
+        "parquet": gerar_parquet,
+    }
+    if formato not in geradores:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    if formato == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise ValueError("Exportação em Parquet requer o pacote pyarrow instalado.")
+    return geradores[formato](linhas)
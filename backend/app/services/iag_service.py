@@ -1,10 +1,104 @@
 import time
 import json
 import re
+import asyncio
+import logging
+import sqlite3
+import unicodedata
+from contextlib import aclosing
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
+from typing import Any, Dict, List, Optional
 from app.models.schemas import AnaliseOutput, Metadata
 from app.core.config import settings
+from app.db.cache import CacheResumos
+from app.validation.output_validator import OutputValidator
+
+# Formato pedido ao modelo no modo de saída estruturada
+SCHEMA_SAIDA = '{"resumo": "string", "classificacao": "string", "palavras_chave": ["string"]}'
+
+# Limite da coluna ResultadoAnalise.classificacao (String(100))
+TAMANHO_MAXIMO_CLASSIFICACAO = 100
+
+# Trecho do texto original (em caracteres) reenviado nas retentativas
+TAMANHO_TEXTO_REPROMPT = 2000
+
+# Parágrafos menores que isto (em caracteres) não são resumidos no modo incremental
+TAMANHO_MINIMO_PARAGRAFO = 200
+
+class ExtratorJSON:
+    """
+    Extrai o primeiro objeto JSON de uma resposta recebida em pedaços.
+
+    Cada caractere é examinado uma única vez, acompanhando a profundidade de
+    chaves e se está dentro de uma string; texto antes do objeto (como cercas
+    ```json) é ignorado. Assim que o objeto se fecha ele é decodificado, sem
+    esperar o fim do stream.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+
+    def alimentar(self, pedaco: str) -> Optional[Any]:
+        for caractere in pedaco:
+            if self._profundidade == 0 and caractere != "{":
+                continue
+            self._buffer.append(caractere)
+
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif caractere == "\\":
+                    self._escape = True
+                elif caractere == '"':
+                    self._em_string = False
+            elif caractere == '"':
+                self._em_string = True
+            elif caractere == "{":
+                self._profundidade += 1
+            elif caractere == "}":
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    try:
+                        return json.loads("".join(self._buffer))
+                    except json.JSONDecodeError:
+                        self._buffer = []
+        return None
+
+
+class MetricasModelo:
+    """
+    Contadores do processo para acompanhar o aproveitamento das chamadas ao modelo.
+
+    Resumos servidos do cache também contam em `resumos_validos`, de modo que
+    `resumos_validos_por_chamada` mede a vazão efetiva por chamada paga.
+    """
+
+    def __init__(self):
+        self.chamadas_modelo = 0
+        self.resumos_validos = 0
+        self.retentativas = 0
+        self.falhas_validacao = 0
+        self.acertos_cache = 0
+        self.paragrafos_resumidos = 0
+        self.paragrafos_reaproveitados = 0
+
+    def resumo(self) -> Dict[str, Any]:
+        return {
+            "chamadas_modelo": self.chamadas_modelo,
+            "resumos_validos": self.resumos_validos,
+            "retentativas": self.retentativas,
+            "falhas_validacao": self.falhas_validacao,
+            "acertos_cache": self.acertos_cache,
+            "paragrafos_resumidos": self.paragrafos_resumidos,
+            "paragrafos_reaproveitados": self.paragrafos_reaproveitados,
+            "resumos_validos_por_chamada": (
+                self.resumos_validos / self.chamadas_modelo if self.chamadas_modelo else 0.0
+            ),
+        }
 
 class IAGService:
     """
@@ -15,12 +109,21 @@ class IAGService:
     def __init__(self):
         # Determina o modelo baseado no MODEL_PROVIDER
         model = self._get_model_by_provider(settings.model_provider)
+        self.model = model
         
         self.client = ChatGoogleGenerativeAI(
             model=model,
             google_api_key=settings.google_api_key
         )
 
+        self.metricas = MetricasModelo()
+
+        # Cache compartilhado entre workers (desativado se CACHE_FILE não estiver definido)
+        self.cache = (
+            CacheResumos(settings.cache_file, settings.cache_max_bytes)
+            if settings.cache_file else None
+        )
+
     def _get_model_by_provider(self, provider: str) -> str:
         """Retorna o modelo apropriado baseado no provider."""
         model_mapping = {
@@ -57,28 +160,224 @@ class IAGService:
         # Se não for JSON válido, retorna o conteúdo limpo
         return content
 
-    async def processar_analise(self, texto: str) -> AnaliseOutput:
-        inicio = time.time()
-        
-        prompt = (
+    def _montar_prompt(self, texto: str) -> str:
+        """Monta o prompt principal, em texto livre ou pedindo o JSON estruturado."""
+        instrucoes = (
             "Você é um assistente que cria resumos em português, simples e claros, "
             "para facilitar o entendimento de estudantes que têm dificuldades de leitura. "
             "Se o texto estiver em outra língua, traduza para o português antes de resumir. "
             "Evite termos técnicos complexos, use linguagem acessível.\n\n"
             f"Texto original:\n{texto}\n\n"
-            "Retorne apenas o resumo simplificado, sem formatação JSON ou markdown."
         )
+        return instrucoes + self._formato_resposta()
+
+    def _formato_resposta(self) -> str:
+        """Instrução final sobre o formato da resposta (texto livre ou JSON)."""
+        if settings.structured_output:
+            return (
+                "Responda somente com um objeto JSON neste formato, sem texto adicional:\n"
+                f"{SCHEMA_SAIDA}\n"
+                "Em \"classificacao\", informe a área do conhecimento (ex: biologia, matemática)."
+            )
+        return "Retorne apenas o resumo simplificado, sem formatação JSON ou markdown."
+
+    def _montar_prompt_merge(self, parciais: List[str]) -> str:
+        """Prompt da etapa de junção dos resumos parciais do modo incremental."""
+        trechos = "\n".join(f"- {parcial}" for parcial in parciais)
+        return (
+            "Os itens abaixo são resumos, em ordem, das partes de um mesmo texto didático. "
+            "Una-os em um único resumo em português, simples, claro e sem repetições, "
+            "para estudantes com dificuldades de leitura.\n\n"
+            f"Resumos das partes:\n{trechos}\n\n"
+        ) + self._formato_resposta()
+
+    def _montar_reprompt(self, texto: str, resumo_rejeitado: str, erro: str) -> str:
+        """
+        Prompt curto usado nas retentativas, sem as instruções de contexto.
+
+        Envia o resumo rejeitado e só o início do texto (TAMANHO_TEXTO_REPROMPT),
+        para que o custo de uma retentativa não cresça com o tamanho do documento.
+        """
+        formato = f"Responda só com JSON: {SCHEMA_SAIDA}" if settings.structured_output else "Responda só com o resumo."
+        trecho = texto if len(texto) <= TAMANHO_TEXTO_REPROMPT else texto[:TAMANHO_TEXTO_REPROMPT] + "..."
+        return (
+            f"Resuma em português simples, com frases completas. A resposta anterior foi rejeitada: {erro}\n"
+            f"Resposta rejeitada:\n{resumo_rejeitado}\n\n"
+            f"{formato}\n\nInício do texto:\n{trecho}"
+        )
+
+    async def _chamar_modelo(self, prompt: str) -> Dict[str, Any]:
+        """Chama o modelo e retorna resumo, classificação e palavras-chave."""
+        if not settings.structured_output:
+            response = await self.client.ainvoke([HumanMessage(content=prompt)])
+            return {"resumo": self._limpar_resumo(response.content), "classificacao": "", "palavras_chave": []}
+
+        # Lê o stream só até o objeto JSON se fechar
+        extrator = ExtratorJSON()
+        dados = None
+        async with aclosing(self.client.astream([HumanMessage(content=prompt)])) as stream:
+            async for chunk in stream:
+                dados = extrator.alimentar(chunk.content)
+                if dados is not None:
+                    break
+
+        if not isinstance(dados, dict) or not isinstance(dados.get("resumo"), str):
+            raise ValueError("A resposta do modelo não contém um JSON válido.")
+
+        palavras_chave = dados.get("palavras_chave") or []
+        return {
+            "resumo": dados["resumo"].strip(),
+            "classificacao": str(dados.get("classificacao") or "").strip()[:TAMANHO_MAXIMO_CLASSIFICACAO],
+            "palavras_chave": [str(p).strip() for p in palavras_chave if str(p).strip()]
+            if isinstance(palavras_chave, list) else []
+        }
+
+    async def _gerar(self, texto: str, prompt: str) -> Dict[str, Any]:
+        """
+        Gera o resumo e o valida; se a validação falhar, tenta de novo com um
+        prompt mais curto (ver _montar_reprompt), até OUTPUT_RETRY_BUDGET vezes.
+        """
+        erro = ""
+        resumo_rejeitado = ""
+        for tentativa in range(settings.output_retry_budget + 1):
+            if tentativa > 0:
+                self.metricas.retentativas += 1
+                prompt = self._montar_reprompt(texto, resumo_rejeitado, erro)
+
+            self.metricas.chamadas_modelo += 1
+            resumo_rejeitado = ""
+            try:
+                dados = await self._chamar_modelo(prompt)
+
+                # Se o resumo estiver muito longo, trunca
+                if len(dados["resumo"]) > 500:
+                    dados["resumo"] = dados["resumo"][:500] + "..."
+                resumo_rejeitado = dados["resumo"]
+
+                OutputValidator.validar(dados["resumo"])
+            except ValueError as e:
+                self.metricas.falhas_validacao += 1
+                erro = str(e)
+                continue
+
+            self.metricas.resumos_validos += 1
+            return dados
+
+        raise ValueError(erro)
+
+    async def _obter_cache(self, chave: str) -> Optional[str]:
+        """Leitura do cache fora do event loop; erro do SQLite conta como ausência."""
+        try:
+            return await asyncio.to_thread(self.cache.obter, chave)
+        except sqlite3.Error as e:
+            logging.warning(f"Não foi possível ler do cache: {e}")
+            return None
+
+    async def _gravar_cache(self, chave: str, valor: str) -> None:
+        """Gravação no cache fora do event loop; chamada só com resultados já validados."""
+        try:
+            await asyncio.to_thread(self.cache.gravar, chave, valor)
+        except sqlite3.Error as e:
+            # Falha no cache não deve descartar um resumo já pago
+            logging.warning(f"Não foi possível gravar no cache: {e}")
+
+    @staticmethod
+    def _dividir_paragrafos(texto: str) -> List[str]:
+        """Divide o texto em parágrafos normalizados (espaços e Unicode NFC)."""
+        paragrafos = []
+        for bloco in re.split(r'\n\s*\n', texto):
+            normalizado = " ".join(unicodedata.normalize("NFC", bloco).split())
+            if normalizado:
+                paragrafos.append(normalizado)
+        return paragrafos
+
+    async def _resumir_paragrafo(self, paragrafo: str, limite: asyncio.Semaphore) -> str:
+        """Resumo parcial de um parágrafo, reaproveitado do cache quando já existe."""
+        if len(paragrafo) < TAMANHO_MINIMO_PARAGRAFO:
+            # Parágrafos curtos entram na junção como estão, sem chamada ao modelo
+            return paragrafo
+
+        chave = CacheResumos.chave(self.model, "paragrafo", paragrafo)
+        em_cache = await self._obter_cache(chave)
+        if em_cache is not None:
+            self.metricas.paragrafos_reaproveitados += 1
+            return em_cache
+
+        prompt = (
+            "Resuma o trecho abaixo em uma ou duas frases simples, em português, "
+            "mantendo as informações principais. Retorne apenas o resumo.\n\n"
+            f"Trecho:\n{paragrafo}"
+        )
+        async with limite:
+            self.metricas.chamadas_modelo += 1
+            self.metricas.paragrafos_resumidos += 1
+            response = await self.client.ainvoke([HumanMessage(content=prompt)])
+        parcial = self._limpar_resumo(response.content)
+
+        try:
+            OutputValidator.validar(parcial)
+        except ValueError as e:
+            # Parcial inválido não vai para o cache; a junção usa o parágrafo original
+            self.metricas.falhas_validacao += 1
+            logging.warning(f"Resumo parcial rejeitado: {e}")
+            return paragrafo
+
+        await self._gravar_cache(chave, parcial)
+        return parcial
+
+    async def _gerar_incremental(self, paragrafos: List[str]) -> Dict[str, Any]:
+        """
+        Resume apenas os parágrafos ainda não vistos e junta os resumos parciais
+        em uma chamada curta; o custo de reenviar um texto editado acompanha o
+        tamanho da edição, não o do documento.
+        """
+        limite = asyncio.Semaphore(settings.incremental_max_concurrency)
+        # Se um parágrafo falhar, o TaskGroup cancela os demais (não seguem pagando chamadas)
+        try:
+            async with asyncio.TaskGroup() as grupo:
+                tarefas = [grupo.create_task(self._resumir_paragrafo(p, limite)) for p in paragrafos]
+        except ExceptionGroup as erros:
+            raise erros.exceptions[0]
+        parciais = [tarefa.result() for tarefa in tarefas]
+        prompt = self._montar_prompt_merge(parciais)
+
+        # Se nenhum parcial mudou (ex: só espaços foram editados), a junção também é reaproveitada
+        chave = CacheResumos.chave(self.model, prompt)
+        em_cache = await self._obter_cache(chave)
+        if em_cache is not None:
+            self.metricas.acertos_cache += 1
+            self.metricas.resumos_validos += 1
+            return json.loads(em_cache)
+
+        # _gerar só retorna resumos que passaram pelo OutputValidator
+        dados = await self._gerar("\n".join(parciais), prompt)
+        await self._gravar_cache(chave, json.dumps(dados, ensure_ascii=False))
+        return dados
+
+    async def processar_analise(self, texto: str) -> AnaliseOutput:
+        inicio = time.time()
+        
+        prompt = self._montar_prompt(texto)
 
-        response = await self.client.ainvoke([HumanMessage(content=prompt)])
-        content = response.content
+        chave = CacheResumos.chave(self.model, prompt) if self.cache else None
+        em_cache = await self._obter_cache(chave) if self.cache else None
 
-        # Limpa o resumo
-        resumo = self._limpar_resumo(content)
+        if em_cache is not None:
+            self.metricas.acertos_cache += 1
+            self.metricas.resumos_validos += 1
+            dados = json.loads(em_cache)
+        else:
+            paragrafos = self._dividir_paragrafos(texto) if settings.incremental_summary and self.cache else []
+            if len(paragrafos) > 1:
+                dados = await self._gerar_incremental(paragrafos)
+            else:
+                dados = await self._gerar(texto, prompt)
 
-        # Se o resumo estiver muito longo, trunca
-        if len(resumo) > 500:
-            resumo = resumo[:500] + "..."
+            # Só chega aqui um resultado validado: _gerar levanta ValueError após o orçamento
+            if self.cache:
+                await self._gravar_cache(chave, json.dumps(dados, ensure_ascii=False))
 
+        resumo = dados["resumo"]
         tempo_processamento = time.time() - inicio
         
         metadata = Metadata(
@@ -90,7 +389,9 @@ class IAGService:
 
         return AnaliseOutput(
             resumo=resumo, 
-            classificacao="", 
+            # O corte também cobre resultados gravados no cache antes do limite
+            classificacao=dados.get("classificacao", "")[:TAMANHO_MAXIMO_CLASSIFICACAO], 
+            palavras_chave=dados.get("palavras_chave", []),
             metadata=metadata
         )
 
@@ -0,0 +1,290 @@
+import asyncio
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Rótulos usados na raiz de cada pilha coletada
+RAIZ_NO_LOOP = "[no loop]"
+RAIZ_AWAIT = "[await]"
+RAIZ_LOOP_OCUPADO = "[loop ocupado por outra tarefa]"
+
+
+def _nome_frame(frame) -> str:
+    code = frame.f_code
+    nome = getattr(code, "co_qualname", code.co_name)
+    return f"{nome} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _pilha_thread(frame) -> List[str]:
+    """Pilha de uma thread, da raiz até o frame em execução."""
+    pilha = []
+    while frame is not None:
+        pilha.append(_nome_frame(frame))
+        frame = frame.f_back
+    pilha.reverse()
+    return pilha
+
+
+def _pilha_task(task: asyncio.Task) -> List[str]:
+    """Pilha lógica de uma task suspensa, seguindo a cadeia de awaits."""
+    pilha = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        pilha.append(_nome_frame(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        if coro is not None and not hasattr(coro, "cr_frame") and not hasattr(coro, "gi_frame"):
+            pilha.append(f"<{type(coro).__name__}>")
+            break
+    return pilha
+
+
+def token_valido(recebido: Optional[str], esperado: Optional[str]) -> bool:
+    """Compara um token recebido com o configurado, em tempo constante."""
+    if not esperado or recebido is None:
+        return False
+    return hmac.compare_digest(recebido.encode("utf-8"), esperado.encode("utf-8"))
+
+
+class AmostradorRequisicao:
+    """
+    Amostra periodicamente, a partir de uma thread auxiliar, o que a tarefa de
+    uma requisição está fazendo no event loop.
+
+    Cada amostra entra no perfil de tempo de parede, rotulada `[no loop]` quando
+    a tarefa da requisição ocupa o event loop e `[await]` quando está suspensa
+    (nesse caso registra-se o ponto do await em que ela aguarda). Ocupar o loop
+    não é o mesmo que usar CPU: uma chamada bloqueante feita no loop também
+    conta como `[no loop]`. Por isso o perfil de CPU pondera cada amostra no
+    loop pelo tempo de CPU que a thread do loop consumiu desde a amostra
+    anterior, lido do relógio de CPU da thread (onde o sistema o oferece).
+
+    Enquanto a requisição segura o GIL, a thread de amostragem acorda bem menos
+    que `intervalo`; por isso cada amostra pesa o tempo real decorrido desde a
+    anterior, e não o intervalo nominal.
+    """
+
+    def __init__(self, intervalo: float):
+        self.intervalo = intervalo
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.thread_loop = threading.get_ident()
+        # (instante, pilha, CPU da thread do loop e tempo de parede desde a amostra anterior)
+        self.amostras: List[Tuple[float, Tuple[str, ...], float, float]] = []
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._relogio_cpu = self._obter_relogio_cpu()
+        self._ultimo_cpu = 0.0
+        self._ultimo_instante = 0.0
+        self.inicio = 0.0
+        self.fim = 0.0
+
+    def _obter_relogio_cpu(self) -> Optional[int]:
+        try:
+            return time.pthread_getcpuclockid(self.thread_loop)
+        except (AttributeError, OSError):
+            return None
+
+    def _cpu_loop(self) -> float:
+        return time.clock_gettime(self._relogio_cpu) if self._relogio_cpu is not None else 0.0
+
+    def iniciar(self) -> None:
+        self.inicio = time.perf_counter()
+        self._ultimo_cpu = self._cpu_loop()
+        self._thread.start()
+
+    def parar(self) -> None:
+        self._parar.set()
+        self._thread.join()
+        self.fim = time.perf_counter()
+
+    def _executar(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            self._amostrar()
+
+    def _amostrar(self) -> None:
+        atual = asyncio.current_task(self.loop)
+        instante = time.perf_counter() - self.inicio
+        peso, self._ultimo_instante = instante - self._ultimo_instante, instante
+        cpu = self._cpu_loop()
+        delta_cpu, self._ultimo_cpu = cpu - self._ultimo_cpu, cpu
+
+        if atual is self.task:
+            frame = sys._current_frames().get(self.thread_loop)
+            if frame is None:
+                return
+            pilha = [RAIZ_NO_LOOP] + _pilha_thread(frame)
+        else:
+            pilha = [RAIZ_AWAIT]
+            if atual is not None:
+                pilha.append(RAIZ_LOOP_OCUPADO)
+            pilha += _pilha_task(self.task)
+            delta_cpu = 0.0
+        self.amostras.append((instante, tuple(pilha), delta_cpu, peso))
+
+    def resumo(self) -> Dict[str, Any]:
+        no_loop = [a for a in self.amostras if a[1][0] == RAIZ_NO_LOOP]
+        return {
+            "tempo_parede": self.fim - self.inicio,
+            "tempo_no_loop": sum(a[3] for a in no_loop),
+            "tempo_cpu": sum(a[2] for a in no_loop) if self._relogio_cpu is not None else None,
+            "amostras": len(self.amostras),
+        }
+
+    def collapsed(self) -> str:
+        """
+        Perfil de parede no formato de pilhas colapsadas (flamegraph.pl / speedscope),
+        com o peso de cada pilha em microssegundos.
+        """
+        contagem: Counter = Counter()
+        for _, pilha, _, peso in self.amostras:
+            contagem[";".join(pilha)] += peso
+        return "".join(
+            f"{pilha} {round(peso * 1_000_000)}\n" for pilha, peso in contagem.most_common()
+        )
+
+    def speedscope(self, nome: str) -> Dict:
+        """Perfil no formato speedscope, com um perfil de parede e outro de CPU."""
+        frames: List[Dict[str, str]] = []
+        indices: Dict[str, int] = {}
+
+        def indice(nome_frame: str) -> int:
+            if nome_frame not in indices:
+                indices[nome_frame] = len(frames)
+                frames.append({"name": nome_frame})
+            return indices[nome_frame]
+
+        def perfil(tipo: str, pilhas: List[Tuple[str, ...]], pesos: List[float]) -> Dict:
+            return {
+                "type": "sampled",
+                "name": f"{nome} ({tipo})",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.fim - self.inicio,
+                "samples": [[indice(f) for f in pilha] for pilha in pilhas],
+                "weights": pesos,
+            }
+
+        cpu = [a for a in self.amostras if a[1][0] == RAIZ_NO_LOOP and a[2] > 0]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": nome,
+            "exporter": "text_summarizer profiler",
+            "activeProfileIndex": 0,
+            "profiles": [
+                perfil("parede", [a[1] for a in self.amostras], [a[3] for a in self.amostras]),
+                perfil("cpu", [a[1] for a in cpu], [a[2] for a in cpu]),
+            ],
+            "shared": {"frames": frames},
+        }
+
+
+class ArmazenamentoPerfis:
+    """Guarda os últimos N perfis em disco, nos formatos collapsed e speedscope."""
+
+    def __init__(self, diretorio: str, maximo: int):
+        self.diretorio = diretorio
+        self.maximo = maximo
+
+    def salvar(self, perfil_id: str, amostrador: AmostradorRequisicao, rota: str) -> None:
+        os.makedirs(self.diretorio, exist_ok=True)
+        base = os.path.join(self.diretorio, perfil_id)
+        with open(f"{base}.collapsed", "w", encoding="utf-8") as arquivo:
+            arquivo.write(amostrador.collapsed())
+        with open(f"{base}.speedscope.json", "w", encoding="utf-8") as arquivo:
+            json.dump(amostrador.speedscope(rota), arquivo)
+        with open(f"{base}.meta.json", "w", encoding="utf-8") as arquivo:
+            json.dump({"id": perfil_id, "rota": rota, **amostrador.resumo()}, arquivo)
+        self._rotacionar()
+
+    def _rotacionar(self) -> None:
+        ids = self.listar_ids()
+        for antigo in ids[:-self.maximo] if self.maximo > 0 else ids:
+            for extensao in (".collapsed", ".speedscope.json", ".meta.json"):
+                try:
+                    os.remove(os.path.join(self.diretorio, antigo + extensao))
+                except FileNotFoundError:
+                    pass
+
+    def listar_ids(self) -> List[str]:
+        if not os.path.isdir(self.diretorio):
+            return []
+        return sorted(nome[:-len(".meta.json")] for nome in os.listdir(self.diretorio) if nome.endswith(".meta.json"))
+
+    def listar(self) -> List[Dict]:
+        perfis = []
+        for perfil_id in reversed(self.listar_ids()):
+            try:
+                with open(os.path.join(self.diretorio, f"{perfil_id}.meta.json"), encoding="utf-8") as arquivo:
+                    perfis.append(json.load(arquivo))
+            except FileNotFoundError:
+                continue
+        return perfis
+
+    def caminho(self, perfil_id: str, formato: str) -> Optional[str]:
+        extensoes = {"collapsed": ".collapsed", "speedscope": ".speedscope.json"}
+        if formato not in extensoes or perfil_id not in self.listar_ids():
+            return None
+        return os.path.join(self.diretorio, perfil_id + extensoes[formato])
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila requisições por amostragem ou sob demanda.
+
+    Uma requisição é perfilada quando traz o cabeçalho configurado com o valor
+    de PROFILING_TOKEN, ou quando é sorteada pela taxa de amostragem. Sem token
+    configurado, o cabeçalho é ignorado. O id do perfil volta no cabeçalho
+    X-Profile-Id da resposta.
+    """
+
+    def __init__(self, app, armazenamento: ArmazenamentoPerfis, taxa_amostragem: float,
+                 cabecalho: str, intervalo: float, token: Optional[str] = None):
+        self.app = app
+        self.armazenamento = armazenamento
+        self.taxa_amostragem = taxa_amostragem
+        self.cabecalho = cabecalho.lower().encode("latin-1")
+        self.intervalo = intervalo
+        self.token = token
+
+    def _deve_perfilar(self, scope) -> bool:
+        if self.token:
+            for nome, valor in scope.get("headers", []):
+                if nome == self.cabecalho and token_valido(valor.decode("latin-1"), self.token):
+                    return True
+        return self.taxa_amostragem > 0 and random.random() < self.taxa_amostragem
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._deve_perfilar(scope):
+            await self.app(scope, receive, send)
+            return
+
+        perfil_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+        async def send_com_id(mensagem):
+            if mensagem["type"] == "http.response.start":
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"x-profile-id", perfil_id.encode("latin-1"))]
+            await send(mensagem)
+
+        amostrador = AmostradorRequisicao(self.intervalo)
+        amostrador.iniciar()
+        try:
+            await self.app(scope, receive, send_com_id)
+        finally:
+            amostrador.parar()
+            rota = f"{scope.get('method', '')} {scope.get('path', '')}"
+            await asyncio.to_thread(self.armazenamento.salvar, perfil_id, amostrador, rota)
+
+
+armazenamento_perfis = ArmazenamentoPerfis(settings.profiling_dir, settings.profiling_max_profiles)
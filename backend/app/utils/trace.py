@@ -0,0 +1,36 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+_lock = threading.Lock()
+
+def _gravar_linha(caminho: str, linha: str) -> None:
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    with _lock:
+        with open(caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(linha)
+
+async def registrar_requisicao(caminho: str, tamanho_texto: int, opcoes: Optional[Dict[str, Any]]) -> None:
+    """
+    Acrescenta uma linha JSONL descrevendo uma chamada a /analise.
+
+    Apenas o instante de chegada, o tamanho do texto e as opções são gravados;
+    o texto em si não é armazenado. A escrita roda fora do event loop e uma
+    falha ao gravar só gera um aviso: o trace nunca derruba a requisição.
+    """
+    registro = {
+        "t": time.time(),
+        "tamanho_texto": tamanho_texto,
+        "opcoes": opcoes or {},
+    }
+    linha = json.dumps(registro, ensure_ascii=False) + "\n"
+    try:
+        await asyncio.to_thread(_gravar_linha, caminho, linha)
+    except OSError as e:
+        logging.warning(f"Não foi possível gravar o trace em {caminho}: {e}")
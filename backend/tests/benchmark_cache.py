@@ -0,0 +1,80 @@
+"""
+Mede a latência de leitura do CacheResumos com vários processos acessando o
+mesmo arquivo ao mesmo tempo, como ocorre com uvicorn --workers N.
+
+Exemplo (a partir de backend/):
+    python -m tests.benchmark_cache --processos 4 --leituras 20000 --fracao-escrita 0.05
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from app.db.cache import CacheResumos
+
+def percentil(valores, p):
+    """Percentil pelo método nearest-rank"""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+def preencher(caminho, max_bytes, chaves, tamanho_valor):
+    cache = CacheResumos(caminho, max_bytes)
+    valor = 'x' * tamanho_valor
+    for i in range(chaves):
+        cache.gravar(CacheResumos.chave(str(i)), valor)
+
+def worker(caminho, max_bytes, chaves, leituras, fracao_escrita, tamanho_valor, semente, fila):
+    cache = CacheResumos(caminho, max_bytes)
+    rng = random.Random(semente)
+    valor = 'y' * tamanho_valor
+    latencias, acertos = [], 0
+    for _ in range(leituras):
+        chave = CacheResumos.chave(str(rng.randrange(chaves)))
+        if rng.random() < fracao_escrita:
+            cache.gravar(chave, valor)
+            continue
+        inicio = time.perf_counter()
+        acertos += cache.obter(chave) is not None
+        latencias.append(time.perf_counter() - inicio)
+    fila.put((latencias, acertos))
+
+def main(args):
+    caminho = os.path.join(tempfile.mkdtemp(), 'cache_benchmark.db')
+    preencher(caminho, args.max_bytes, args.chaves, args.tamanho_valor)
+
+    fila = multiprocessing.Queue()
+    processos = [
+        multiprocessing.Process(
+            target=worker,
+            args=(caminho, args.max_bytes, args.chaves, args.leituras, args.fracao_escrita, args.tamanho_valor, i, fila)
+        )
+        for i in range(args.processos)
+    ]
+    inicio = time.perf_counter()
+    for p in processos:
+        p.start()
+    resultados = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+    duracao = time.perf_counter() - inicio
+
+    latencias = [l for lat, _ in resultados for l in lat]
+    acertos = sum(a for _, a in resultados)
+    print(f"processos: {args.processos}  leituras: {len(latencias)}  taxa de acerto: {acertos / len(latencias):.2%}")
+    print(f"vazão agregada de leitura: {len(latencias) / duracao:,.0f}/s")
+    for p in (50, 90, 99, 99.9):
+        print(f"p{p}: {percentil(latencias, p) * 1e6:8.1f} µs")
+    print(f"max:  {max(latencias) * 1e6:8.1f} µs")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processos', type=int, default=4)
+    parser.add_argument('--leituras', type=int, default=20000, help='Operações por processo')
+    parser.add_argument('--chaves', type=int, default=5000)
+    parser.add_argument('--fracao-escrita', type=float, default=0.05)
+    parser.add_argument('--tamanho-valor', type=int, default=600, help='Bytes por entrada (um resumo ~500 caracteres)')
+    parser.add_argument('--max-bytes', type=int, default=256 * 1024 * 1024)
+    main(parser.parse_args())
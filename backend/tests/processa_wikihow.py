@@ -1,11 +1,22 @@
+import ast
 import csv
+import hashlib
 import requests
 import time
 import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
 
 # Configurações
 CSV_ENTRADA = 'data/wikihowAll.csv'
-CSV_SAIDA = 'data/wikihow_results.csv'
+CSV_SAIDA = 'data/wikihow_results.csv'  # formato legado, usado apenas na conversão
+DIR_SAIDA = 'data/wikihow_results'
+DIR_RESULTADOS = os.path.join(DIR_SAIDA, 'resultados')
+DIR_TEXTOS = os.path.join(DIR_SAIDA, 'textos')
 URL_API = 'http://localhost:8000/api/v1/analise'
 
 # Parâmetros padrão para o resumo
@@ -18,113 +29,212 @@ OPCOES = {
 # Limite de textos a processar (ajuste para None para processar todos)
 LIMITE = None  # Exemplo: processar só 100 para teste
 
+# Quantidade de linhas acumuladas antes de gravar um novo arquivo Parquet
+TAMANHO_LOTE = 500
+
+# Colunas usadas para particionar os resultados (diretórios chave=valor)
+COLUNAS_PARTICAO = ['status', 'nivel_ensino']
+
+# Esquema dos resultados: metadados em colunas tipadas e texto referenciado por chave
+SCHEMA_RESULTADOS = pa.schema([
+    ('texto_id', pa.string()),
+    ('headline', pa.string()),
+    ('title', pa.string()),
+    ('resumo', pa.string()),
+    ('classificacao', pa.string()),
+    ('tempo_processamento', pa.float64()),
+    ('tamanho_original', pa.int64()),
+    ('tamanho_resumo', pa.int64()),
+    ('taxa_compressao', pa.float64()),
+    ('max_length', pa.int32()),
+    ('language', pa.string()),
+    ('nivel_ensino', pa.string()),
+    ('status', pa.string()),
+    ('erro', pa.string()),
+])
+
+SCHEMA_TEXTOS = pa.schema([
+    ('texto_id', pa.string()),
+    ('text', pa.string()),
+])
+
+def chave_texto(text):
+    """Gera a chave estável usada para referenciar o texto original"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _dataset(caminho, schema, particionado=False):
+    """Abre um dataset Parquet existente, com memory-map (ou None se ainda não houver arquivos)"""
+    if not os.path.exists(caminho):
+        return None
+    particionamento = 'hive' if particionado else None
+    return ds.dataset(
+        caminho,
+        schema=schema,
+        format='parquet',
+        partitioning=particionamento,
+        filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+def carregar_resultados(colunas=None, filtro=None):
+    """
+    Lê os resultados como tabela Arrow, apenas com as colunas e partições pedidas.
+
+    Exemplo: carregar_resultados(['title', 'resumo'], ds.field('status') == 'ok')
+    Use .to_pandas() no retorno para obter um DataFrame.
+    """
+    dataset = _dataset(DIR_RESULTADOS, SCHEMA_RESULTADOS, particionado=True)
+    if dataset is None:
+        return SCHEMA_RESULTADOS.empty_table().select(colunas or SCHEMA_RESULTADOS.names)
+    return dataset.to_table(columns=colunas, filter=filtro)
+
+def carregar_textos(texto_ids=None, colunas=None):
+    """Lê os textos originais, opcionalmente só as chaves informadas"""
+    dataset = _dataset(DIR_TEXTOS, SCHEMA_TEXTOS)
+    if dataset is None:
+        return SCHEMA_TEXTOS.empty_table().select(colunas or SCHEMA_TEXTOS.names)
+    filtro = ds.field('texto_id').isin(list(texto_ids)) if texto_ids is not None else None
+    return dataset.to_table(columns=colunas, filter=filtro)
+
 def carregar_processados():
-    """Carrega os títulos já processados do CSV de saída"""
-    processados = set()
-    if os.path.exists(CSV_SAIDA):
-        with open(CSV_SAIDA, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                status = row.get('status', '').strip()
-                # Só considera processado se status for "ok"
-                if status == 'ok':
-                    processados.add(row.get('title', '').strip())
-    return processados
+    """Carrega os títulos já processados (apenas a partição status=ok)"""
+    tabela = carregar_resultados(['title'], ds.field('status') == 'ok')
+    return {title.strip() for title in tabela.column('title').to_pylist() if title}
+
+def carregar_chaves_textos():
+    """Carrega as chaves dos textos já gravados, para não duplicá-los"""
+    return set(carregar_textos(colunas=['texto_id']).column('texto_id').to_pylist())
+
+def linha_resultado(texto_id, headline, title, status, resumo='', classificacao='', metadata=None, erro=''):
+    """Monta uma linha de resultado com os metadados em colunas tipadas"""
+    metadata = metadata or {}
+    return {
+        'texto_id': texto_id,
+        'headline': headline,
+        'title': title,
+        'resumo': resumo,
+        'classificacao': classificacao,
+        'tempo_processamento': metadata.get('tempo_processamento'),
+        'tamanho_original': metadata.get('tamanho_original'),
+        'tamanho_resumo': metadata.get('tamanho_resumo'),
+        'taxa_compressao': metadata.get('taxa_compressao'),
+        'max_length': OPCOES['max_length'],
+        'language': OPCOES['language'],
+        'nivel_ensino': OPCOES['nivel_ensino'],
+        'status': status,
+        'erro': erro
+    }
+
+def gravar_lote(resultados, textos):
+    """Grava um lote de resultados (particionado) e de textos novos em arquivos Parquet"""
+    sufixo = uuid.uuid4().hex
+    if resultados:
+        pq.write_to_dataset(
+            pa.Table.from_pylist(resultados, schema=SCHEMA_RESULTADOS),
+            DIR_RESULTADOS,
+            partition_cols=COLUNAS_PARTICAO,
+            basename_template=f'parte-{sufixo}-{{i}}.parquet'
+        )
+        resultados.clear()
+    if textos:
+        os.makedirs(DIR_TEXTOS, exist_ok=True)
+        pq.write_table(
+            pa.Table.from_pylist(textos, schema=SCHEMA_TEXTOS),
+            os.path.join(DIR_TEXTOS, f'parte-{sufixo}.parquet')
+        )
+        textos.clear()
+
+def converter_csv_legado():
+    """Converte o CSV único antigo (CSV_SAIDA) para o formato Parquet particionado"""
+    chaves = carregar_chaves_textos()
+    resultados, textos = [], []
+    with open(CSV_SAIDA, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            text = row.get('text', '')
+            texto_id = chave_texto(text)
+            if texto_id not in chaves:
+                chaves.add(texto_id)
+                textos.append({'texto_id': texto_id, 'text': text})
+
+            metadata = ast.literal_eval(row['metadata']) if row.get('metadata') else {}
+            linha = linha_resultado(
+                texto_id, row.get('headline', ''), row.get('title', ''), row.get('status', ''),
+                resumo=row.get('resumo', ''), classificacao=row.get('classificacao', ''),
+                metadata=metadata, erro=row.get('erro', '')
+            )
+            linha.update({
+                'max_length': int(row['max_length']) if row.get('max_length') else None,
+                'language': row.get('language', ''),
+                'nivel_ensino': row.get('nivel_ensino', '')
+            })
+            resultados.append(linha)
+
+            if len(resultados) >= TAMANHO_LOTE:
+                gravar_lote(resultados, textos)
+    gravar_lote(resultados, textos)
 
 def main():
     # Carrega títulos já processados
     processados = carregar_processados()
+    chaves = carregar_chaves_textos()
     print(f"Encontrados {len(processados)} textos já processados")
-    
-    with open(CSV_ENTRADA, newline='', encoding='utf-8') as csvfile_in, \
-         open(CSV_SAIDA, 'a', newline='', encoding='utf-8') as csvfile_out:
+
+    resultados, textos = [], []
+    with open(CSV_ENTRADA, newline='', encoding='utf-8') as csvfile_in:
         reader = csv.DictReader(csvfile_in)
-        
-        # Verifica se o arquivo de saída está vazio para escrever o cabeçalho
-        if os.path.getsize(CSV_SAIDA) == 0:
-            fieldnames = [
-                'headline', 'title', 'text',
-                'resumo', 'classificacao', 'metadata',
-                'max_length', 'language', 'nivel_ensino', 'status', 'erro'
-            ]
-            writer = csv.DictWriter(csvfile_out, fieldnames=fieldnames)
-            writer.writeheader()
-        else:
-            fieldnames = [
-                'headline', 'title', 'text',
-                'resumo', 'classificacao', 'metadata',
-                'max_length', 'language', 'nivel_ensino', 'status', 'erro'
-            ]
-            writer = csv.DictWriter(csvfile_out, fieldnames=fieldnames)
 
         contador = 0
-        for i, row in enumerate(reader):
-            if LIMITE and contador >= LIMITE:
-                break
-                
-            title = row.get('title', '').strip()
-            headline = row.get('headline', '').strip()
-            text = row.get('text', '').strip()
-            
-            # Pula se não tem texto ou se já foi processado
-            if not text or title in processados:
-                continue
-                
-            payload = {
-                "texto": text,
-                "opcoes": OPCOES
-            }
-            try:
-                inicio = time.time()
-                resp = requests.post(URL_API, json=payload, timeout=300)
-                tempo = time.time() - inicio
-                if resp.status_code == 201:
-                    data = resp.json()
-                    writer.writerow({
-                        'headline': headline,
-                        'title': title,
-                        'text': text,
-                        'resumo': data.get('resumo', ''),
-                        'classificacao': data.get('classificacao', ''),
-                        'metadata': data.get('metadata', {}),
-                        'max_length': OPCOES['max_length'],
-                        'language': OPCOES['language'],
-                        'nivel_ensino': OPCOES['nivel_ensino'],
-                        'status': 'ok',
-                        'erro': ''
-                    })
-                else:
-                    writer.writerow({
-                        'headline': headline,
-                        'title': title,
-                        'text': text,
-                        'resumo': '',
-                        'classificacao': '',
-                        'metadata': '',
-                        'max_length': OPCOES['max_length'],
-                        'language': OPCOES['language'],
-                        'nivel_ensino': OPCOES['nivel_ensino'],
-                        'status': 'erro',
-                        'erro': f"HTTP {resp.status_code}: {resp.text}"
-                    })
-                contador += 1
-                print(f"Processado {contador}: {title}")
-            except Exception as e:
-                writer.writerow({
-                    'headline': headline,
-                    'title': title,
-                    'text': text,
-                    'resumo': '',
-                    'classificacao': '',
-                    'metadata': '',
-                    'max_length': OPCOES['max_length'],
-                    'language': OPCOES['language'],
-                    'nivel_ensino': OPCOES['nivel_ensino'],
-                    'status': 'erro',
-                    'erro': str(e)
-                })
-                contador += 1
-                print(f"Erro no {contador}: {title} - {str(e)}")
+        try:
+            for i, row in enumerate(reader):
+                if LIMITE and contador >= LIMITE:
+                    break
+
+                title = row.get('title', '').strip()
+                headline = row.get('headline', '').strip()
+                text = row.get('text', '').strip()
+
+                # Pula se não tem texto ou se já foi processado
+                if not text or title in processados:
+                    continue
+
+                # O texto é gravado uma única vez e referenciado pela chave
+                texto_id = chave_texto(text)
+                if texto_id not in chaves:
+                    chaves.add(texto_id)
+                    textos.append({'texto_id': texto_id, 'text': text})
+
+                payload = {
+                    "texto": text,
+                    "opcoes": OPCOES
+                }
+                try:
+                    inicio = time.time()
+                    resp = requests.post(URL_API, json=payload, timeout=300)
+                    tempo = time.time() - inicio
+                    if resp.status_code == 201:
+                        data = resp.json()
+                        resultados.append(linha_resultado(
+                            texto_id, headline, title, 'ok',
+                            resumo=data.get('resumo', ''),
+                            classificacao=data.get('classificacao', ''),
+                            metadata=data.get('metadata') or {}
+                        ))
+                    else:
+                        resultados.append(linha_resultado(
+                            texto_id, headline, title, 'erro',
+                            erro=f"HTTP {resp.status_code}: {resp.text}"
+                        ))
+                    contador += 1
+                    print(f"Processado {contador}: {title}")
+                except Exception as e:
+                    resultados.append(linha_resultado(texto_id, headline, title, 'erro', erro=str(e)))
+                    contador += 1
+                    print(f"Erro no {contador}: {title} - {str(e)}")
+
+                if len(resultados) >= TAMANHO_LOTE:
+                    gravar_lote(resultados, textos)
+        finally:
+            # Garante que o último lote parcial seja gravado mesmo em caso de interrupção
+            gravar_lote(resultados, textos)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -1,6 +1,19 @@
+import io
+import json
 import pytest
-from httpx import AsyncClient
+import pytest_asyncio
+import pyarrow.parquet as pq
+from datetime import datetime, timezone
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.main import app
+from app.core.config import settings
+from app.db.connection import get_db
+from app.models.sql_models import Base, ResultadoAnalise
+import app.api.routes as routes
+from tests.replay_trafego import criar_stub_modelo
 
 @pytest.mark.asyncio
 async def test_analise_texto_sucesso():
@@ -30,3 +43,99 @@ async def test_analise_texto_sem_campo():
     async with AsyncClient(app=app, base_url="http://test") as ac:
         response = await ac.post("/analise", json=payload)
     assert response.status_code == 422  # erro de validação do Pydantic
+
+@pytest_asyncio.fixture
+async def banco_exportacao(tmp_path, monkeypatch):
+    """Banco SQLite com 30 registros, usado no lugar do PostgreSQL pela exportação."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'export.db'}",
+        poolclass=AsyncAdaptedQueuePool
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with SessionLocal() as db:
+        for i in range(30):
+            db.add(ResultadoAnalise(
+                texto=f"Texto didático número {i}",
+                resumo=f"Resumo {i}",
+                classificacao="biologia",
+                criado_em=datetime(2024, 1, 1 + i, tzinfo=timezone.utc)
+            ))
+        await db.commit()
+
+    monkeypatch.setattr(routes, "AsyncSessionLocal", SessionLocal)
+    yield engine
+    await engine.dispose()
+
+async def _exportar(params):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        return await ac.get("/api/v1/historico/export", params=params)
+
+@pytest.mark.asyncio
+async def test_exportar_historico_ndjson_filtra_e_devolve_conexao(banco_exportacao):
+    response = await _exportar({"formato": "ndjson", "id_inicio": 5, "id_fim": 9})
+
+    assert response.status_code == 200
+    linhas = [json.loads(l) for l in response.text.splitlines()]
+    assert [l["id"] for l in linhas] == [5, 6, 7, 8, 9]
+    assert linhas[0]["texto_original"] == "Texto didático número 4"
+
+    # A sessão do stream foi fechada e a conexão voltou ao pool
+    assert banco_exportacao.pool.checkedout() == 0
+
+@pytest.mark.asyncio
+async def test_exportar_historico_csv_filtra_por_data(banco_exportacao):
+    response = await _exportar({
+        "formato": "csv",
+        "data_inicio": "2024-01-10T00:00:00+00:00",
+        "data_fim": "2024-01-13T00:00:00+00:00"
+    })
+
+    assert response.status_code == 200
+    linhas = response.text.splitlines()
+    assert linhas[0].startswith("id,texto_original")
+    assert [l.split(",")[0] for l in linhas[1:]] == ["10", "11", "12"]
+    assert banco_exportacao.pool.checkedout() == 0
+
+@pytest.mark.asyncio
+async def test_exportar_historico_parquet(banco_exportacao):
+    response = await _exportar({"formato": "parquet"})
+
+    assert response.status_code == 200
+    tabela = pq.read_table(io.BytesIO(response.content))
+    assert tabela.num_rows == 30
+    assert tabela.column("id").to_pylist() == list(range(1, 31))
+    assert banco_exportacao.pool.checkedout() == 0
+
+@pytest.mark.asyncio
+async def test_exportar_historico_formato_invalido(banco_exportacao):
+    response = await _exportar({"formato": "xlsx"})
+    assert response.status_code == 400
+    assert banco_exportacao.pool.checkedout() == 0
+
+@pytest.mark.asyncio
+async def test_analise_nao_falha_quando_trace_nao_pode_ser_gravado(banco_exportacao, tmp_path, monkeypatch):
+    arquivo = tmp_path / "arquivo"
+    arquivo.write_text("")
+    monkeypatch.setattr(settings, "trace_file", str(arquivo / "trace.jsonl"))
+    monkeypatch.setattr(routes, "processar_analise", criar_stub_modelo(0.0, 0.0))
+    SessionLocal = sessionmaker(banco_exportacao, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_db_teste():
+        async with SessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_db_teste
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.post("/api/v1/analise", json={
+                "texto": "Texto didático sobre a fotossíntese, com tamanho suficiente para passar na validação de entrada."
+            })
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    assert response.status_code == 201
+    assert response.json()["resumo"] == "Resumo gerado pelo stub de carga."
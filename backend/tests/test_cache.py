@@ -0,0 +1,38 @@
+import sqlite3
+import time
+from app.db.cache import CacheResumos
+
+def test_cache_resumos_lru_com_limite(tmp_path):
+    caminho = str(tmp_path / "cache.db")
+    cache = CacheResumos(caminho, max_bytes=1000, resolucao_acesso=0)
+    for i in range(5):
+        cache.gravar(CacheResumos.chave(str(i)), "x" * 100)
+    assert cache.obter(CacheResumos.chave("0")) == "x" * 100
+
+    # Outra instância (como outro worker) enxerga o mesmo conteúdo
+    outro_worker = CacheResumos(caminho, max_bytes=1000, resolucao_acesso=0)
+    for i in range(5, 10):
+        outro_worker.gravar(CacheResumos.chave(str(i)), "x" * 100)
+
+    assert outro_worker.tamanho_total() <= 1000
+    assert cache.obter(CacheResumos.chave("0")) is not None  # acessada recentemente
+    assert cache.obter(CacheResumos.chave("1")) is None      # menos usada, removida
+    assert cache.obter(CacheResumos.chave("9")) is not None
+
+def test_obter_nao_espera_lock_de_escrita(tmp_path):
+    caminho = str(tmp_path / "cache.db")
+    cache = CacheResumos(caminho, max_bytes=10_000, resolucao_acesso=0)
+    chave = CacheResumos.chave("a")
+    cache.gravar(chave, "valor")
+    time.sleep(0.01)  # deixa o acesso "velho" para forçar a atualização do LRU
+
+    # Outro worker segura o lock de escrita
+    outro_worker = sqlite3.connect(caminho, isolation_level=None)
+    outro_worker.execute("BEGIN IMMEDIATE")
+    try:
+        inicio = time.perf_counter()
+        assert cache.obter(chave) == "valor"
+        assert time.perf_counter() - inicio < 1.0
+    finally:
+        outro_worker.execute("ROLLBACK")
+        outro_worker.close()
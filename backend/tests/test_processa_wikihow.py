@@ -0,0 +1,76 @@
+import csv
+import pytest
+import pyarrow.dataset as ds
+from tests import processa_wikihow as pw
+
+@pytest.fixture
+def saida(tmp_path, monkeypatch):
+    """Redireciona os diretórios de saída do processamento em lote para tmp_path."""
+    monkeypatch.setattr(pw, "CSV_SAIDA", str(tmp_path / "wikihow_results.csv"))
+    monkeypatch.setattr(pw, "DIR_RESULTADOS", str(tmp_path / "resultados"))
+    monkeypatch.setattr(pw, "DIR_TEXTOS", str(tmp_path / "textos"))
+    return tmp_path
+
+def test_linha_resultado_tipa_metadados():
+    linha = pw.linha_resultado(
+        "abc", "headline", "Título", "ok",
+        resumo="Resumo",
+        metadata={"tempo_processamento": 1.5, "tamanho_original": 100, "tamanho_resumo": 20, "taxa_compressao": 0.2}
+    )
+    assert linha["tempo_processamento"] == 1.5
+    assert linha["tamanho_original"] == 100
+    assert linha["nivel_ensino"] == pw.OPCOES["nivel_ensino"]
+
+    erro = pw.linha_resultado("abc", "headline", "Título", "erro", erro="HTTP 500")
+    assert erro["tempo_processamento"] is None
+
+def test_gravar_lote_e_ler_por_particao(saida):
+    texto = "Como plantar uma árvore no quintal."
+    texto_id = pw.chave_texto(texto)
+    resultados = [
+        pw.linha_resultado(texto_id, "h1", "Árvore", "ok", resumo="Plante com cuidado.",
+                           metadata={"tempo_processamento": 2.0, "tamanho_original": 35, "tamanho_resumo": 19, "taxa_compressao": 0.54}),
+        pw.linha_resultado(texto_id, "h2", "Árvore de novo", "erro", erro="HTTP 400"),
+    ]
+    textos = [{"texto_id": texto_id, "text": texto}]
+
+    pw.gravar_lote(resultados, textos)
+    assert resultados == [] and textos == []
+
+    # Os arquivos ficam em diretórios chave=valor por status
+    assert (saida / "resultados" / "status=ok").is_dir()
+    assert (saida / "resultados" / "status=erro").is_dir()
+
+    ok = pw.carregar_resultados(["texto_id", "title", "tempo_processamento"], ds.field("status") == "ok")
+    assert ok.to_pylist() == [{"texto_id": texto_id, "title": "Árvore", "tempo_processamento": 2.0}]
+    assert pw.carregar_processados() == {"Árvore"}
+
+    # O texto é resolvido pela chave, sem estar repetido nos resultados
+    assert pw.carregar_textos([texto_id]).to_pylist() == [{"texto_id": texto_id, "text": texto}]
+    assert pw.carregar_chaves_textos() == {texto_id}
+
+def test_converter_csv_legado(saida):
+    campos = ['headline', 'title', 'text', 'resumo', 'classificacao', 'metadata',
+              'max_length', 'language', 'nivel_ensino', 'status', 'erro']
+    metadata = {'tempo_processamento': 1.5, 'tamanho_original': 7, 'tamanho_resumo': 1, 'taxa_compressao': 0.14}
+    with open(pw.CSV_SAIDA, "w", newline="", encoding="utf-8") as arquivo:
+        writer = csv.DictWriter(arquivo, fieldnames=campos)
+        writer.writeheader()
+        writer.writerow(dict(headline='h', title='A', text='texto a', resumo='r', classificacao='',
+                             metadata=str(metadata), max_length=300, language='en-US',
+                             nivel_ensino='superior', status='ok', erro=''))
+        writer.writerow(dict(headline='h', title='B', text='texto a', resumo='', classificacao='',
+                             metadata='', max_length=300, language='en-US',
+                             nivel_ensino='superior', status='erro', erro='HTTP 400'))
+
+    pw.converter_csv_legado()
+
+    tabela = pw.carregar_resultados().to_pylist()
+    assert sorted(l["title"] for l in tabela) == ["A", "B"]
+    linha_a = next(l for l in tabela if l["title"] == "A")
+    assert linha_a["taxa_compressao"] == 0.14
+    assert linha_a["max_length"] == 300
+    assert linha_a["nivel_ensino"] == "superior"
+
+    # Os dois registros apontam para o mesmo texto, gravado uma única vez
+    assert pw.carregar_textos().num_rows == 1
@@ -1,6 +1,13 @@
 import pytest
 import asyncio
-from app.services.iag_service import processar_analise
+import json
+from types import SimpleNamespace
+from app.core.config import settings
+from app.services.iag_service import (
+    processar_analise, ExtratorJSON, IAGService, TAMANHO_MAXIMO_CLASSIFICACAO, TAMANHO_TEXTO_REPROMPT
+)
+from app.services.export_service import gerar_exportacao
+from app.db.cache import CacheResumos
 
 @pytest.mark.asyncio
 async def test_processar_analise_retorna_resumo():
@@ -12,3 +19,254 @@ async def test_processar_analise_retorna_resumo():
     assert resultado.resumo != ""
 
     # assert hasattr(resultado, "classificacao")
+
+async def _linhas_exemplo():
+    yield {
+        "id": 1,
+        "texto_original": "Texto, com vírgula",
+        "resumo": "Resumo",
+        "classificacao": "biologia",
+        "tamanho_original": 18,
+        "tamanho_resumo": 6,
+        "taxa_compressao": 6 / 18,
+        "criado_em": "2024-02-20T10:30:00",
+    }
+
+@pytest.mark.asyncio
+async def test_exportacao_ndjson_e_csv():
+    ndjson = b"".join([parte async for parte in gerar_exportacao("ndjson", _linhas_exemplo())])
+    assert ndjson.decode("utf-8").count("\n") == 1
+    assert '"texto_original": "Texto, com vírgula"' in ndjson.decode("utf-8")
+
+    csv_bytes = b"".join([parte async for parte in gerar_exportacao("csv", _linhas_exemplo())])
+    linhas = csv_bytes.decode("utf-8").splitlines()
+    assert linhas[0].startswith("id,texto_original,resumo")
+    assert '"Texto, com vírgula"' in linhas[1]
+
+def test_exportacao_formato_invalido():
+    with pytest.raises(ValueError):
+        gerar_exportacao("xlsx", _linhas_exemplo())
+
+def test_extrator_json_em_pedacos():
+    resposta = 'Claro! ```json\n{"resumo": "Texto com {chaves} e \\"aspas\\".", "palavras_chave": ["a"]}\n``` fim'
+    extrator = ExtratorJSON()
+    resultado = None
+    for i in range(0, len(resposta), 5):
+        resultado = extrator.alimentar(resposta[i:i + 5])
+        if resultado is not None:
+            break
+
+    assert resultado == {"resumo": 'Texto com {chaves} e "aspas".', "palavras_chave": ["a"]}
+
+def test_extrator_json_sem_objeto():
+    assert ExtratorJSON().alimentar("Resumo em texto livre, sem JSON.") is None
+
+def test_dividir_paragrafos_normaliza_espacos():
+    original = "Primeiro   parágrafo.\n\nSegundo\nparágrafo."
+    editado = "  Primeiro parágrafo. \n \n\n Segundo parágrafo.\n"
+    assert IAGService._dividir_paragrafos(original) == ["Primeiro parágrafo.", "Segundo parágrafo."]
+    assert IAGService._dividir_paragrafos(editado) == IAGService._dividir_paragrafos(original)
+
+class _ClienteStub:
+    """Substitui o cliente do Gemini: registra os prompts e responde com `responder(prompt)`."""
+
+    def __init__(self, responder, atraso=0.0):
+        self.responder = responder
+        self.atraso = atraso
+        self.prompts = []
+        self.em_andamento = 0
+        self.max_em_andamento = 0
+
+    async def ainvoke(self, mensagens):
+        self.prompts.append(mensagens[0].content)
+        self.em_andamento += 1
+        self.max_em_andamento = max(self.max_em_andamento, self.em_andamento)
+        try:
+            await asyncio.sleep(self.atraso)
+        finally:
+            self.em_andamento -= 1
+        return SimpleNamespace(content=self.responder(mensagens[0].content))
+
+    async def astream(self, mensagens):
+        self.prompts.append(mensagens[0].content)
+        self.stream_fechado = False
+        resposta = self.responder(mensagens[0].content)
+        try:
+            for i in range(0, len(resposta), 8):
+                yield SimpleNamespace(content=resposta[i:i + 8])
+        finally:
+            self.stream_fechado = True
+
+def _servico_stub(responder, cache_path=None, atraso=0.0):
+    servico = IAGService()
+    servico.client = _ClienteStub(responder, atraso)
+    servico.cache = CacheResumos(str(cache_path), max_bytes=1_000_000) if cache_path else None
+    return servico
+
+@pytest.mark.asyncio
+async def test_cache_evita_segunda_chamada_ao_modelo(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", False)
+    monkeypatch.setattr(settings, "incremental_summary", False)
+    servico = _servico_stub(lambda prompt: "Um resumo simples e claro.", tmp_path / "cache.db")
+
+    primeiro = await servico.processar_analise("Texto sobre fotossíntese nas plantas.")
+    segundo = await servico.processar_analise("Texto sobre fotossíntese nas plantas.")
+
+    assert len(servico.client.prompts) == 1
+    assert segundo.resumo == primeiro.resumo == "Um resumo simples e claro."
+    metricas = servico.metricas.resumo()
+    assert metricas["acertos_cache"] == 1
+    assert metricas["chamadas_modelo"] == 1
+    assert metricas["resumos_validos_por_chamada"] == 2.0
+
+@pytest.mark.asyncio
+async def test_resumo_rejeitado_nao_vai_para_o_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", False)
+    monkeypatch.setattr(settings, "incremental_summary", False)
+    monkeypatch.setattr(settings, "output_retry_budget", 0)
+    servico = _servico_stub(lambda prompt: "curto", tmp_path / "cache.db")
+
+    with pytest.raises(ValueError):
+        await servico.processar_analise("Texto sobre fotossíntese nas plantas.")
+
+    assert servico.cache.tamanho_total() == 0
+    assert servico.metricas.acertos_cache == 0
+
+@pytest.mark.asyncio
+async def test_orcamento_de_retentativas_esgotado(monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", False)
+    monkeypatch.setattr(settings, "output_retry_budget", 2)
+    servico = _servico_stub(lambda prompt: "curto")
+    texto = "Texto didático longo. " * 1000
+
+    with pytest.raises(ValueError):
+        await servico.processar_analise(texto)
+
+    assert len(servico.client.prompts) == 3
+    metricas = servico.metricas.resumo()
+    assert metricas["chamadas_modelo"] == 3
+    assert metricas["retentativas"] == 2
+    assert metricas["falhas_validacao"] == 3
+    assert metricas["resumos_validos"] == 0
+    assert metricas["resumos_validos_por_chamada"] == 0.0
+
+    # As retentativas levam o resumo rejeitado e só o início do texto
+    for reprompt in servico.client.prompts[1:]:
+        assert "Resposta rejeitada:\ncurto" in reprompt
+        assert len(reprompt) < TAMANHO_TEXTO_REPROMPT + 500
+
+@pytest.mark.asyncio
+async def test_retentativa_recupera_resumo_valido(monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", False)
+    monkeypatch.setattr(settings, "output_retry_budget", 2)
+    servico = _servico_stub(lambda prompt: "curto" if "Texto original" in prompt else "Um resumo simples e claro.")
+
+    resultado = await servico.processar_analise("Texto sobre fotossíntese nas plantas.")
+
+    assert resultado.resumo == "Um resumo simples e claro."
+    metricas = servico.metricas.resumo()
+    assert (metricas["chamadas_modelo"], metricas["retentativas"], metricas["falhas_validacao"]) == (2, 1, 1)
+    assert metricas["resumos_validos_por_chamada"] == 0.5
+
+@pytest.mark.asyncio
+async def test_saida_estruturada_fecha_o_stream(monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", True)
+    resposta = '{"resumo": "Um resumo simples e claro.", "classificacao": "biologia", "palavras_chave": ["célula"]} texto extra depois do objeto'
+    servico = _servico_stub(lambda prompt: resposta)
+
+    resultado = await servico.processar_analise("Texto sobre células.")
+
+    assert resultado.classificacao == "biologia"
+    assert resultado.palavras_chave == ["célula"]
+    assert servico.client.stream_fechado
+
+@pytest.mark.asyncio
+async def test_saida_estruturada_limita_classificacao(monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", True)
+    classificacao = "biologia celular, " * 20
+    resposta = json.dumps({"resumo": "Um resumo simples e claro.", "classificacao": classificacao})
+    servico = _servico_stub(lambda prompt: resposta)
+
+    resultado = await servico.processar_analise("Texto sobre células.")
+
+    assert resultado.classificacao == classificacao.strip()[:TAMANHO_MAXIMO_CLASSIFICACAO]
+
+def _responder_incremental(prompt):
+    """Resumo parcial determinístico por parágrafo; junção com texto fixo."""
+    if "Trecho:" in prompt:
+        return "Resumo do trecho: " + prompt.split("Trecho:\n", 1)[1][:30]
+    return "Resumo final unindo as partes."
+
+_PARAGRAFOS = [
+    ("Primeiro parágrafo sobre a célula e suas organelas. " * 5).strip(),
+    ("Segundo parágrafo sobre a membrana plasmática. " * 5).strip(),
+    ("Terceiro parágrafo sobre a divisão celular e a mitose. " * 5).strip(),
+]
+
+@pytest.mark.asyncio
+async def test_incremental_so_reenvia_o_que_mudou(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", False)
+    monkeypatch.setattr(settings, "incremental_summary", True)
+    servico = _servico_stub(_responder_incremental, tmp_path / "cache.db")
+    prompts = servico.client.prompts
+
+    # Primeira submissão: 3 parágrafos + 1 junção
+    await servico.processar_analise("\n\n".join(_PARAGRAFOS))
+    assert len(prompts) == 4
+    assert servico.metricas.paragrafos_resumidos == 3
+
+    # Só espaços editados: parciais e junção vêm do cache
+    antes = len(prompts)
+    resultado = await servico.processar_analise("  " + "\n \n\n".join(p.replace(". ", ".  ") for p in _PARAGRAFOS))
+    assert len(prompts) == antes
+    assert resultado.resumo == "Resumo final unindo as partes."
+    assert servico.metricas.paragrafos_reaproveitados == 3
+    assert servico.metricas.acertos_cache == 1
+    assert servico.metricas.resumos_validos == 2
+
+    # Um parágrafo editado: 1 chamada de parágrafo + a junção (o parcial mudou)
+    editados = [_PARAGRAFOS[0], "Novo segundo parágrafo, reescrito. " * 6, _PARAGRAFOS[2]]
+    antes = len(prompts)
+    await servico.processar_analise("\n\n".join(editados))
+    novos = prompts[antes:]
+    assert sum("Trecho:" in p for p in novos) == 1
+    assert len(novos) == 2
+    assert servico.metricas.paragrafos_reaproveitados == 5
+
+@pytest.mark.asyncio
+async def test_incremental_limita_paragrafos_em_paralelo(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", False)
+    monkeypatch.setattr(settings, "incremental_summary", True)
+    monkeypatch.setattr(settings, "incremental_max_concurrency", 2)
+    servico = _servico_stub(_responder_incremental, tmp_path / "cache.db", atraso=0.01)
+    paragrafos = [f"Parágrafo {i} sobre um tema diferente de biologia. " * 5 for i in range(8)]
+
+    await servico.processar_analise("\n\n".join(paragrafos))
+
+    assert servico.metricas.paragrafos_resumidos == 8
+    assert servico.client.max_em_andamento == 2
+
+@pytest.mark.asyncio
+async def test_incremental_cancela_paragrafos_quando_um_falha(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "structured_output", False)
+    monkeypatch.setattr(settings, "incremental_summary", True)
+    servico = _servico_stub(_responder_incremental, tmp_path / "cache.db")
+    concluidas = []
+
+    async def ainvoke(mensagens):
+        if "falha" in mensagens[0].content:
+            raise ConnectionError("conexão perdida")
+        await asyncio.sleep(0.2)
+        concluidas.append(mensagens[0].content)
+        return SimpleNamespace(content="Resumo do trecho concluído.")
+
+    servico.client.ainvoke = ainvoke
+    paragrafos = [f"Parágrafo {i} sobre um tema diferente de biologia. " * 5 for i in range(3)]
+    paragrafos.append("Parágrafo com falha na chamada ao modelo. " * 5)
+
+    with pytest.raises(ConnectionError):
+        await servico.processar_analise("\n\n".join(paragrafos))
+    await asyncio.sleep(0.3)
+
+    assert concluidas == []
+    assert servico.cache.tamanho_total() == 0